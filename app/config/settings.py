@@ -42,8 +42,15 @@ class VectorStoreSettings(BaseModel):
     """Settings for the VectorStore."""
 
     table_name: str = "embeddings_1"
-    embedding_dimensions: int = 1536
+    embedding_dimensions: int = 768
     time_partition_interval: timedelta = timedelta(days=7)
+    max_db_connections: int = 8
+    query_cache_size: int = 4096
+    embedding_max_workers: int = 4
+    embedding_max_retries: int = 3
+    hnsw_m: int = 24
+    hnsw_ef_construction: int = 128
+    hnsw_ef_search: int = 100
 
 
 class Settings(BaseModel):
@@ -1,11 +1,18 @@
+import io
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any, List, Optional, Tuple, Union
 from datetime import datetime
 import os
 
+import numpy as np
 import pandas as pd
 from config.settings import get_settings
+from google.api_core.exceptions import ResourceExhausted
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
 from timescale_vector import client
 import google.generativeai as genai
 
@@ -23,7 +30,12 @@ class VectorStore:
             self.vector_settings.table_name,
             self.vector_settings.embedding_dimensions,
             time_partition_interval=self.vector_settings.time_partition_interval,
+            distance_type="euclidean",
+            max_db_connections=self.vector_settings.max_db_connections,
         )
+        self._cached_query_embedding = lru_cache(
+            maxsize=self.vector_settings.query_cache_size
+        )(self._embed_query)
 
     def get_embedding(self, text: str) -> List[float]:
         """
@@ -35,14 +47,81 @@ class VectorStore:
         Returns:
             A list of floats representing the embedding.
         """
-        text = text.replace("\n", " ")
-        start_time = time.time()
-        embedding = genai.embed_content(
-            model="models/text-embedding-004",
-            content=text,
-        )['embedding']
-        elapsed_time = time.time() - start_time
-        logging.info(f"Embedding generated in {elapsed_time:.3f} seconds")
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+        """
+        Generate embeddings for many texts using batched Gemini requests.
+
+        Args:
+            texts: The input texts to generate embeddings for.
+            batch_size: The number of texts sent per request (Gemini accepts at most 100).
+
+        Returns:
+            A list of embeddings, in the same order as the input texts.
+        """
+        cleaned = [text.replace("\n", " ") for text in texts]
+        batches = [
+            cleaned[i : i + batch_size] for i in range(0, len(cleaned), batch_size)
+        ]
+        debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            start_time = time.time()
+        if len(batches) == 1:
+            # Single queries skip the thread pool entirely
+            embeddings = self._embed_batch(batches[0])
+        else:
+            # Requests are network-bound, so threads overlap them; map preserves order
+            with ThreadPoolExecutor(
+                max_workers=self.vector_settings.embedding_max_workers
+            ) as executor:
+                embeddings = [
+                    embedding
+                    for batch_embeddings in executor.map(self._embed_batch, batches)
+                    for embedding in batch_embeddings
+                ]
+        if debug_enabled:
+            elapsed_time = time.time() - start_time
+            logging.debug(
+                f"Generated {len(embeddings)} embeddings in {elapsed_time:.3f} seconds"
+            )
+        return embeddings
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a single batch of already-cleaned texts in one Gemini request."""
+        max_retries = self.vector_settings.embedding_max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                response = genai.embed_content(
+                    model=self.settings.gemini.embedding_model,
+                    content=texts,
+                    output_dimensionality=self.vector_settings.embedding_dimensions,
+                )
+                break
+            except ResourceExhausted:
+                # Concurrent batches can hit Gemini's rate limit; back off and retry
+                if attempt == max_retries:
+                    raise
+                delay = 2**attempt
+                logging.warning(f"Gemini rate limit hit, retrying in {delay}s")
+                time.sleep(delay)
+        embeddings = np.asarray(response['embedding'], dtype=np.float32)
+        return self._normalize(embeddings).tolist()
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """Unit-normalize rows in place so L2 distance ranks exactly like cosine distance."""
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        # Leave zero vectors as-is instead of dividing them into NaNs
+        norms[norms == 0] = 1
+        embeddings /= norms
+        return embeddings
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        """Embed a normalized query as a read-only float32 array for the LRU cache."""
+        # ~3 KB per cached entry, versus ~25 KB for a tuple of Python floats
+        embedding = np.asarray(self.get_embedding(text), dtype=np.float32)
+        embedding.flags.writeable = False
         return embedding
 
     def create_tables(self) -> None:
@@ -50,10 +129,15 @@ class VectorStore:
         self.vec_client.create_tables()
 
     def create_index(self) -> None:
-        """Create the StreamingDiskANN index to speed up similarity search if it doesn't exist"""
+        """Create the HNSW index to speed up similarity search if it doesn't exist"""
         try:
-            self.vec_client.create_embedding_index(client.DiskAnnIndex())
-            logging.info(f"Created DiskANN index for {self.vector_settings.table_name}")
+            self.vec_client.create_embedding_index(
+                client.HNSWIndex(
+                    m=self.vector_settings.hnsw_m,
+                    ef_construction=self.vector_settings.hnsw_ef_construction,
+                )
+            )
+            logging.info(f"Created HNSW index for {self.vector_settings.table_name}")
         except Exception as e:
             if "already exists" in str(e):
                 logging.info(f"Index already exists for {self.vector_settings.table_name}")
@@ -62,7 +146,7 @@ class VectorStore:
                 raise e
 
     def drop_index(self) -> None:
-        """Drop the StreamingDiskANN index in the database"""
+        """Drop the HNSW index in the database"""
         self.vec_client.drop_embedding_index()
 
     def upsert(self, df: pd.DataFrame) -> None:
@@ -71,14 +155,48 @@ class VectorStore:
 
         Args:
             df: A pandas DataFrame containing the data to insert or update.
-                Expected columns: id, metadata, contents, embedding
+                Expected columns: id, metadata, contents (or content), embedding
+                Embeddings are unit-normalized before they are stored.
         """
-        records = df.to_records(index=False)
-        self.vec_client.upsert(list(records))
+        contents_column = "contents" if "contents" in df.columns else "content"
+        records = df[["id", "metadata", contents_column]]
+        vector_literals = self._to_vector_literals(df["embedding"].tolist())
+        rows = [
+            # Like the client's upsert, only JSON-encode metadata not already a string
+            (
+                id_,
+                metadata if isinstance(metadata, str) else Json(metadata),
+                contents,
+                vector_literal,
+            )
+            for (id_, metadata, contents), vector_literal in zip(
+                records.itertuples(index=False, name=None), vector_literals
+            )
+        ]
+        query = sql.SQL(
+            "INSERT INTO {} (id, metadata, contents, embedding) VALUES %s ON CONFLICT DO NOTHING"
+        ).format(sql.Identifier(self.vector_settings.table_name))
+        # Multi-row VALUES pages instead of the client's per-row executemany
+        with self.vec_client.connect() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur, query, rows, template="(%s, %s, %s, %s::vector)", page_size=500
+                )
         logging.info(
             f"Inserted {len(df)} records into {self.vector_settings.table_name}"
         )
 
+    @staticmethod
+    def _to_vector_literals(embeddings: List[List[float]]) -> List[str]:
+        """Serialize embeddings to pgvector text literals in one numpy formatting pass."""
+        if not embeddings:
+            return []
+        buffer = io.StringIO()
+        # Normalize here too, since callers may upsert their own vectors
+        vectors = VectorStore._normalize(np.array(embeddings, dtype=np.float32))
+        np.savetxt(buffer, vectors, fmt="%.9g", delimiter=",")
+        return [f"[{line}]" for line in buffer.getvalue().splitlines()]
+
     def search(
         self,
         query_text: str,
@@ -87,6 +205,7 @@ class VectorStore:
         predicates: Optional[client.Predicates] = None,
         time_range: Optional[Tuple[datetime, datetime]] = None,
         return_dataframe: bool = True,
+        return_embedding: bool = False,
     ) -> Union[List[Tuple[Any, ...]], pd.DataFrame]:
         """
         Query the vector database for similar embeddings based on input text.
@@ -105,9 +224,11 @@ class VectorStore:
                 - | is used to combine multiple predicates with OR operator.
             time_range: A tuple of (start_date, end_date) to filter results by time.
             return_dataframe: Whether to return results as a DataFrame (default: True).
+            return_embedding: Whether to keep the embedding column in the DataFrame (default: False).
 
         Returns:
             Either a list of tuples or a pandas DataFrame containing the search results.
+            In both cases the distance is cosine distance (1 - cosine similarity).
 
         Basic Examples:
             Basic search:
@@ -127,12 +248,16 @@ class VectorStore:
             Search with time range:
                 vector_store.search("Recent updates", time_range=(datetime(2024, 1, 1), datetime(2024, 1, 31)))
         """
-        query_embedding = self.get_embedding(query_text)
+        # Repeated queries are served from the cache instead of calling Gemini again;
+        # only whitespace is normalized so the embedded text keeps its original casing
+        normalized_query = " ".join(query_text.split())
+        query_embedding = self._cached_query_embedding(normalized_query)
 
         start_time = time.time()
 
         search_args = {
             "limit": limit,
+            "query_params": client.HNSWIndexParams(self.vector_settings.hnsw_ef_search),
         }
 
         if metadata_filter:
@@ -146,24 +271,32 @@ class VectorStore:
             search_args["uuid_time_filter"] = client.UUIDTimeRange(start_date, end_date)
 
         results = self.vec_client.search(query_embedding, **search_args)
+
+        # The client returns L2 distance; embeddings are unit-normalized, so report
+        # cosine distance (1 - cos = L2^2 / 2) for both return types
+        distance_idx = client.SEARCH_RESULT_DISTANCE_IDX
+        for result in results:
+            result[distance_idx] = result[distance_idx] ** 2 / 2
         elapsed_time = time.time() - start_time
 
         logging.info(f"Vector search completed in {elapsed_time:.3f} seconds")
 
         if return_dataframe:
-            return self._create_dataframe_from_results(results)
+            return self._create_dataframe_from_results(results, return_embedding)
         else:
             return results
 
     def _create_dataframe_from_results(
         self,
         results: List[Tuple[Any, ...]],
+        return_embedding: bool = False,
     ) -> pd.DataFrame:
         """
         Create a pandas DataFrame from the search results.
 
         Args:
             results: A list of tuples containing the search results.
+            return_embedding: Whether to keep the embedding column.
 
         Returns:
             A pandas DataFrame containing the formatted search results.
@@ -173,10 +306,13 @@ class VectorStore:
             results, columns=["id", "metadata", "content", "embedding", "distance"]
         )
 
-        # Expand metadata column
-        df = pd.concat(
-            [df.drop(["metadata"], axis=1), df["metadata"].apply(pd.Series)], axis=1
-        )
+        # Drop the embedding vectors unless the caller asked for them
+        if not return_embedding:
+            df = df.drop(columns=["embedding"])
+
+        # Expand metadata column with a single DataFrame construction
+        metadata_df = pd.DataFrame(df.pop("metadata").tolist(), index=df.index)
+        df = pd.concat([df, metadata_df], axis=1)
 
         # Convert id to string for better readability
         df["id"] = df["id"].astype(str)
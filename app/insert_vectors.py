@@ -16,35 +16,31 @@ logging.info("Deleted all existing embeddings")
 # Read the CSV file
 df = pd.read_csv("data/faq_dataset.csv", sep=";")
 
-# Prepare the data with proper metadata
-processed_data = []
-for _, row in df.iterrows():
-    # Create metadata dictionary
-    metadata = {
-        "category": row["category"],
-        "question": row["question"],
-        "created_at": datetime.now().isoformat(),
+# Generate embeddings for all questions in batches (since we'll search by questions)
+embeddings = vec.get_embeddings(df["question"].tolist())
+
+# Build every column up front and create the DataFrame in one go
+now = datetime.now()
+created_at = now.isoformat()
+insert_df = pd.DataFrame(
+    {
+        # UUIDs based on the ingest time so time-range filtering works
+        "id": [uuid_from_time(now) for _ in range(len(df))],
+        "metadata": [
+            {"category": category, "question": question, "created_at": created_at}
+            for category, question in zip(df["category"], df["question"])
+        ],
+        "content": df["answer"].tolist(),  # Store the answer as the main content
+        "embedding": embeddings,
     }
-    
-    # Generate embedding for the question (since we'll search by questions)
-    embedding = vec.get_embedding(row["question"])
-    
-    # Create record with UUID based on current time
-    record = {
-        "id": uuid_from_time(datetime.now()),
-        "metadata": metadata,
-        "content": row["answer"],  # Store the answer as the main content
-        "embedding": embedding
-    }
-    processed_data.append(record)
+)
 
-# Convert to DataFrame and insert
-insert_df = pd.DataFrame(processed_data)
+# Insert the records
 vec.upsert(insert_df)
 
 # Create the index
 vec.create_index()
 
-logging.info(f"Successfully inserted {len(processed_data)} FAQ entries")
+logging.info(f"Successfully inserted {len(insert_df)} FAQ entries")
 
 # %%
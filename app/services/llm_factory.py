@@ -1,28 +1,47 @@
+import json
+import logging
+from functools import lru_cache
 from typing import Any, Dict, List, Type
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import google.generativeai as genai
 import os
 from config.settings import get_settings
 
+
+@lru_cache()
+def get_generative_model(model_name: str) -> genai.GenerativeModel:
+    """Configure Gemini once and return a model instance shared across the process."""
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(model_name)
+
+
 class LLMFactory:
+    ROLE_PREFIXES = {
+        "system": "System: ",
+        "user": "User: ",
+        "assistant": "Assistant: ",
+    }
+
     def __init__(self, provider: str = "gemini"):
         self.provider = provider
         self.settings = get_settings().gemini
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-pro')
+        self.model = get_generative_model(self.settings.default_model)
 
     def create_completion(
         self, response_model: Type[BaseModel], messages: List[Dict[str, str]], **kwargs
     ) -> Any:
-        # Combine messages into a single prompt
+        # Combine messages into a single prompt and describe the expected output
         prompt = self._format_messages(messages)
-        
-        # Generate response using Gemini
+        schema = json.dumps(response_model.model_json_schema())
+        prompt = f"{prompt}\n\nRespond with a JSON object matching this schema:\n{schema}"
+
+        # Generate response using Gemini, constrained to JSON output
         response = self.model.generate_content(
             prompt,
             generation_config=genai.types.GenerationConfig(
                 temperature=kwargs.get("temperature", self.settings.temperature),
                 max_output_tokens=kwargs.get("max_tokens", self.settings.max_tokens),
+                response_mime_type="application/json",
             )
         )
 
@@ -32,29 +51,42 @@ class LLMFactory:
 
     def _format_messages(self, messages: List[Dict[str, str]]) -> str:
         """Format chat messages into a single prompt string."""
-        formatted_messages = []
-        for message in messages:
-            role = message["role"]
-            content = message["content"]
-            if role == "system":
-                formatted_messages.append(f"System: {content}")
-            elif role == "user":
-                formatted_messages.append(f"User: {content}")
-            elif role == "assistant":
-                formatted_messages.append(f"Assistant: {content}")
-        return "\n\n".join(formatted_messages)
+        return "\n\n".join(
+            f"{self.ROLE_PREFIXES[message['role']]}{message['content']}"
+            for message in messages
+            if message["role"] in self.ROLE_PREFIXES
+        )
 
     def _parse_response(self, response: Any, response_model: Type[BaseModel]) -> BaseModel:
         """Parse Gemini response into the expected Pydantic model."""
         response_text = response.text
-        
+
+        # JSON mode returns the object as the whole response, so validate it directly
+        try:
+            return response_model.model_validate_json(response_text)
+        except ValidationError as e:
+            logging.warning(
+                f"Gemini response did not match {response_model.__name__}: {e}"
+            )
+
         # If it's a SynthesizedResponse, create the proper structure
         if response_model.__name__ == 'SynthesizedResponse':
+            # Recover the answer from a partial JSON object rather than showing raw JSON
+            answer = self._get_json_field(response_text, "answer")
             return response_model(
-                answer=response_text,
+                answer=answer if isinstance(answer, str) else response_text,
                 thought_process=["Analyzed context", "Generated response using Gemini model"],
                 enough_context=True  # You might want to make this more dynamic based on context
             )
         
         # For other response types
         return response_model(**{"content": response_text})
+
+    @staticmethod
+    def _get_json_field(response_text: str, field: str) -> Any:
+        """Return a field of a JSON object response, or None if it can't be read."""
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError:
+            return None
+        return data.get(field) if isinstance(data, dict) else None